@@ -27,22 +27,53 @@ THEME: Stealth Slate — Dark Charcoal · Teal Accents · Clean Card Layout
   DM Sans · Card-based sectors · Pill badges · Gradient signals
 """
 
-import io, os, smtplib, logging, time, re
-from datetime import datetime, timedelta
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
+import io, os, sys, ssl, zlib, json, shutil, hashlib, smtplib, logging, time, re, asyncio, threading
+from datetime import date, datetime, timedelta
+from email.message import EmailMessage
+from email.policy import SMTP
+from functools import lru_cache
 from pathlib import Path
-import pytz
+from types import MappingProxyType
+from zoneinfo import ZoneInfo
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
 import numpy as np
 import yfinance as yf
-from bs4 import BeautifulSoup
+import lxml.html
 from dotenv import load_dotenv
 
+try:
+    import aiosmtplib  # optional — parallel sends when there are several recipients
+except ImportError:
+    aiosmtplib = None
+
+try:
+    import pyarrow  # optional — enables the parquet price-history cache
+except ImportError:
+    pyarrow = None
+
+try:
+    import orjson  # optional — faster parsing of NSE JSON responses
+except ImportError:
+    orjson = None
+
+try:
+    import rcssmin  # optional — tokenizing CSS minifier (C extension)
+except ImportError:
+    rcssmin = None
+
+# numba's on-disk cache lives with the other run caches (the workflow persists
+# .cache/ and pins this file's mtime, which numba keys its cache index on)
+os.environ.setdefault("NUMBA_CACHE_DIR", str(Path(".cache") / "numba"))
+try:
+    from numba import njit  # optional — compiles the indicator kernel
+except ImportError:
+    def njit(*args, **kwargs):  # same kernel, run as plain Python
+        return lambda fn: fn
+
 # ── Setup ─────────────────────────────────────────────────────────────────────
 load_dotenv()
 logging.basicConfig(
@@ -53,6 +84,16 @@ logging.basicConfig(
 log = logging.getLogger(__name__)
 OUTPUT_DIR = Path("docs")
 OUTPUT_DIR.mkdir(exist_ok=True)
+HISTORY_CACHE = Path(".cache") / "history"   # per-symbol parquet, see download_history
+HISTORY_DAYS  = 185
+NSE_COOKIE_FILE = Path(".cache") / "nse_cookies.json"
+# The workflow caches .cache/ between runs, which are at most ~15 h apart on
+# weekdays; cookies NSE has expired by then are caught and re-seeded.
+NSE_COOKIE_TTL  = 24 * 60 * 60   # seconds a seeded NSE session is reused for
+REPORT_KEY_FILE = Path(".cache") / "last_report.key"   # input digest of the last report sent
+# Templates, CSS and renderer all live in this file — any edit changes the report
+_CODE_VERSION = hashlib.blake2b(Path(__file__).read_bytes(), digest_size=8).hexdigest()
+_IST = ZoneInfo("Asia/Kolkata")
 
 # ── NSE INDIA HOLIDAYS ────────────────────────────────────────────────────────
 NSE_HOLIDAYS_2025 = {
@@ -68,6 +109,12 @@ NSE_HOLIDAYS_2026 = {
     "2026-10-28","2026-11-25","2026-12-25",
 }
 NSE_HOLIDAYS = NSE_HOLIDAYS_2025 | NSE_HOLIDAYS_2026
+# Parsed once — is_trading_day compares dates, get_date_range steps over the
+# same calendar with numpy's business-day arithmetic
+NSE_HOLIDAY_DATES = frozenset(date.fromisoformat(d) for d in NSE_HOLIDAYS)
+_NSE_BUSDAYS      = np.busdaycalendar(
+    holidays=np.array(sorted(NSE_HOLIDAY_DATES), dtype="datetime64[D]")
+)
 
 # ── Browser / NSE Headers ─────────────────────────────────────────────────────
 BROWSER_HEADERS = {
@@ -96,6 +143,44 @@ NSE_HEADERS = {
     "sec-fetch-site": "same-origin",
 }
 
+# Keys NSE has used for the deal list in its JSON payloads, most likely first
+NSE_JSON_KEYS = ("data", "Data", "results", "records", "bulkDeals",
+                 "blockDeals", "bulkDealData", "blockDealData", "deals")
+
+class _TokenBucket:
+    """Thread-safe token bucket — take() only sleeps when the budget is spent."""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate     = rate          # tokens per second
+        self.capacity = capacity
+        self.tokens   = capacity
+        self.stamp    = time.monotonic()
+        self.lock     = threading.Lock()
+
+    def take(self):
+        with self.lock:
+            now         = time.monotonic()
+            self.tokens = min(self.capacity,
+                              self.tokens + (now - self.stamp) * self.rate)
+            self.stamp  = now
+            wait        = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0
+            self.tokens -= 1
+        if wait:
+            time.sleep(wait)
+
+
+# NSE API calls at most one per 1.5 s (counted from the previous call's start,
+# so time spent on the request itself is not slept again)
+_NSE_BUCKET = _TokenBucket(rate=1 / 1.5)
+
+# Session for the plain-HTTP source (MunafaSutra) — one sequential GET, so the
+# default pool is plenty; the adapter is only there for light retries
+HTTP = requests.Session()
+HTTP.mount("https://", HTTPAdapter(
+    max_retries=Retry(total=2, backoff_factor=0.3,
+                      status_forcelist=(429, 500, 502, 503, 504)),
+))
+
 # ── FII / DII keyword classifiers ─────────────────────────────────────────────
 FII_KW = [
     "FII","FPI","FOREIGN","OVERSEAS","GLOBAL","INTERNATIONAL","NON RESIDENT",
@@ -154,6 +239,24 @@ DII_KW = [
     "PORTFOLIO MANAGEMENT","PMS ",
 ]
 
+def _minimize(kws) -> tuple:
+    """Drop duplicates and any keyword containing a shorter one — for an
+    "any keyword in client" test the shorter keyword already matches."""
+    out = []
+    for k in sorted(set(kws), key=len):
+        if not any(o in k for o in out):
+            out.append(k)
+    return tuple(out)
+
+
+FII_KW = _minimize(FII_KW)
+DII_KW = _minimize(DII_KW)
+
+# Each list compiled into one alternation: a client name is scanned once in C
+# instead of being tested against every keyword with a Python-level `in`
+FII_RX = re.compile("|".join(map(re.escape, FII_KW)))
+DII_RX = re.compile("|".join(map(re.escape, DII_KW)))
+
 # ── FALLBACK stocks ───────────────────────────────────────────────────────────
 FALLBACK_STOCKS = [
     {"symbol":"GMRAIRPORT.NS", "name":"GMR Airports",       "fii_cash":"buy",  "dii_cash":"buy"},
@@ -177,6 +280,7 @@ FALLBACK_STOCKS = [
     {"symbol":"360ONE.NS",     "name":"360 One WAM",        "fii_cash":"buy",  "dii_cash":"buy"},
     {"symbol":"APLAPOLLO.NS",  "name":"APL Apollo Tubes",   "fii_cash":"buy",  "dii_cash":"buy"},
 ]
+FALLBACK_DF = pd.DataFrame(FALLBACK_STOCKS)   # built once at import
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -184,18 +288,33 @@ FALLBACK_STOCKS = [
 # ─────────────────────────────────────────────────────────────────────────────
 
 def is_trading_day(dt: datetime) -> bool:
-    if dt.weekday() >= 5:
-        return False
-    return dt.strftime("%Y-%m-%d") not in NSE_HOLIDAYS
+    return dt.weekday() < 5 and dt.date() not in NSE_HOLIDAY_DATES
+
+
+def _busday(dt: datetime, offset: int) -> datetime:
+    """`offset` NSE trading days from dt, rolling back first if dt is closed."""
+    d = np.busday_offset(dt.date(), offset, roll="backward", busdaycal=_NSE_BUSDAYS)
+    return datetime.combine(d.item(), datetime.min.time())
 
 
 def fmt_nse_date(dt: datetime) -> str:
     return dt.strftime("%d-%m-%Y")
 
 
+_LAST_RANGE = [None, 0.0]   # (from_date, to_date, label), monotonic stamp
+
+
 def get_date_range() -> tuple:
-    IST = pytz.timezone("Asia/Kolkata")
-    now_ist = datetime.now(IST)
+    """Last six NSE trading days — computed once, then reused for 60 s (main()
+    and fetch_from_nse both ask for it during one run)."""
+    now = time.monotonic()
+    if _LAST_RANGE[0] is None or now - _LAST_RANGE[1] >= 60:
+        _LAST_RANGE[:] = [_compute_date_range(), now]
+    return _LAST_RANGE[0]
+
+
+def _compute_date_range() -> tuple:
+    now_ist = datetime.now(_IST)
     today   = now_ist.replace(tzinfo=None).replace(
         hour=0, minute=0, second=0, microsecond=0
     )
@@ -206,29 +325,13 @@ def get_date_range() -> tuple:
         to_date = today
         log.info("  → Past 18:30 IST — TODAY is to_date")
     else:
-        to_date = today - timedelta(days=1)
-        for _ in range(10):
-            if is_trading_day(to_date):
-                break
-            to_date -= timedelta(days=1)
+        to_date = _busday(today - timedelta(days=1), 0)
         log.info("  → Before 18:30 IST — last trading day is to_date")
 
-    from_date = to_date
-    steps     = 0
-    candidate = to_date - timedelta(days=1)
-    while True:
-        if (to_date - candidate).days > 30:
-            log.warning("  ⚠️  Could not find 5 trading days back in 30 days")
-            break
-        if is_trading_day(candidate):
-            steps    += 1
-            from_date = candidate
-            if steps == 5:
-                break
-        candidate -= timedelta(days=1)
+    from_date = _busday(to_date, -5)
 
     label = f"{fmt_nse_date(from_date)} → {fmt_nse_date(to_date)}"
-    log.info(f"  → Date range: {label}  ({steps + 1} trading days)")
+    log.info("  → Date range: %s  (%d trading days)", label, 6)
     return from_date, to_date, label
 
 
@@ -236,6 +339,67 @@ def get_date_range() -> tuple:
 #  SOURCE 1 — NSE CSV Download API
 # ─────────────────────────────────────────────────────────────────────────────
 
+def _classify_deals(df) -> tuple:
+    """Reduce normalised deal rows to one entry per symbol (first-seen order).
+
+    Name and client come from a symbol's first row; fii_cash / dii_cash from
+    its last FII / DII-matched row.  Returns (stocks, matched_row_count).
+    """
+    def col(name):
+        if name in df.columns:
+            return df[name].fillna("").astype(str).str.strip()   # NaN / None -> ""
+        return pd.Series("", index=df.index, dtype=object)
+
+    sym    = col("SYMBOL").str.upper()
+    client = col("CLIENT").str.upper()
+    name   = col("COMPANY")
+    deals  = pd.DataFrame({
+        "sym":    sym,
+        "name":   name.where(name != "", sym),   # no company name → show the symbol
+        "client": client,
+        "action": np.where(col("BUYSELL").str.upper().str.startswith("B"),
+                           "buy", "sell"),
+    })
+    deals = deals[(sym != "") & (sym != "NAN") & (client != "") & (client != "NAN")]
+
+    is_fii = deals["client"].str.contains(FII_RX)
+    is_dii = deals["client"].str.contains(DII_RX)
+    fii    = deals[is_fii].groupby("sym", sort=False)["action"].last().to_dict()
+    dii    = deals[is_dii].groupby("sym", sort=False)["action"].last().to_dict()
+    first  = deals.groupby("sym", sort=False)[["name", "client"]].first()
+
+    stocks = [
+        {
+            "symbol":      s + ".NS",
+            "name":        name,
+            "fii_cash":    fii.get(s, "neutral"),
+            "dii_cash":    dii.get(s, "neutral"),
+            "client_name": cl,
+        }
+        for s, name, cl in zip(first.index, first["name"], first["client"])
+    ]
+    return stocks, int(is_fii.sum() + is_dii.sum())
+
+
+def _load_nse_cookies():
+    """Cookies saved by the last successful NSE fetch, if younger than the TTL."""
+    try:
+        if time.time() - NSE_COOKIE_FILE.stat().st_mtime < NSE_COOKIE_TTL:
+            return json.loads(NSE_COOKIE_FILE.read_text())
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _save_nse_cookies(session_obj):
+    jar = getattr(session_obj.cookies, "jar", session_obj.cookies)   # curl_cffi wraps a CookieJar
+    try:
+        NSE_COOKIE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        NSE_COOKIE_FILE.write_text(json.dumps({c.name: c.value for c in jar}))
+    except OSError as e:
+        log.warning("  -> Could not save NSE cookies: %s", e)
+
+
 def fetch_from_nse() -> list:
     log.info("[Source 1] NSE Bulk/Block Deals — CSV Download API (no 50-row cap)...")
 
@@ -243,7 +407,7 @@ def fetch_from_nse() -> list:
         from_date, to_date, date_range_label = get_date_range()
         from_str = fmt_nse_date(from_date)
         to_str   = fmt_nse_date(to_date)
-        log.info(f"  -> Range: {from_str} to {to_str}")
+        log.info("  -> Range: %s to %s", from_str, to_str)
 
         csv_endpoints = [
             {
@@ -270,35 +434,44 @@ def fetch_from_nse() -> list:
 
         session_obj = None
         use_cffi    = False
+        cookies     = _load_nse_cookies()
+        warm        = cookies is not None
 
-        try:
-            from curl_cffi import requests as cffi_req
-            log.info("  -> Using curl_cffi Chrome120 (Akamai bypass)")
-            session_obj = cffi_req.Session(impersonate="chrome120")
-            session_obj.get("https://www.nseindia.com/", timeout=15)
-            time.sleep(2)
+        def seed(pause):
+            """Homepage + report page visits so NSE/Akamai issue session cookies."""
+            r = session_obj.get("https://www.nseindia.com/", timeout=15)
+            log.info("  -> Homepage HTTP %s | cookies: %s",
+                     r.status_code, list(session_obj.cookies.keys()))
+            time.sleep(pause)
             session_obj.get(
                 "https://www.nseindia.com/report-detail/display-bulk-and-block-deals",
                 timeout=15,
             )
             time.sleep(2)
+
+        try:
+            from curl_cffi import requests as cffi_req
+            log.info("  -> Using curl_cffi Chrome120 (Akamai bypass)")
+            session_obj = cffi_req.Session(impersonate="chrome120")
+            if warm:
+                session_obj.cookies.update(cookies)
+            else:
+                seed(2)
             use_cffi = True
         except ImportError:
             log.warning("  -> curl_cffi not installed — using requests")
         except Exception as e:
-            log.warning(f"  -> curl_cffi error: {e} — using requests")
+            log.warning("  -> curl_cffi error: %s — using requests", e)
 
         if not use_cffi:
             session_obj = requests.Session()
             session_obj.headers.update(NSE_HEADERS)
-            r = session_obj.get("https://www.nseindia.com/", timeout=15)
-            log.info(f"  -> Homepage HTTP {r.status_code} | cookies: {list(session_obj.cookies.keys())}")
-            time.sleep(2.5)
-            session_obj.get(
-                "https://www.nseindia.com/report-detail/display-bulk-and-block-deals",
-                timeout=15,
-            )
-            time.sleep(2)
+            if warm:
+                session_obj.cookies.update(cookies)
+            else:
+                seed(2.5)
+        if warm:
+            log.info("  -> Reusing NSE cookies from %s", NSE_COOKIE_FILE)
 
         csv_req_headers = {
             "Referer": "https://www.nseindia.com/report-detail/display-bulk-and-block-deals",
@@ -309,11 +482,12 @@ def fetch_from_nse() -> list:
 
         for ep in csv_endpoints:
             deal_type = ep["deal_type"]
-            log.info(f"  -> Fetching CSV: {deal_type} ...")
+            log.info("  -> Fetching CSV: %s ...", deal_type)
 
             csv_df = None
             for attempt in range(1, 4):
                 try:
+                    _NSE_BUCKET.take()
                     if use_cffi:
                         resp = session_obj.get(
                             ep["url"],
@@ -332,20 +506,27 @@ def fetch_from_nse() -> list:
                     body    = resp.content
                     preview = body[:300].decode("utf-8", errors="replace").strip()
                     log.info(
-                        f"  -> [{deal_type}] HTTP {resp.status_code} | "
-                        f"{len(body)} bytes | {preview[:80]!r}"
+                        "  -> [%s] HTTP %s | %d bytes | %r",
+                        deal_type, resp.status_code, len(body), preview[:80]
                     )
 
+                    if warm and (resp.status_code != 200
+                                 or preview.lstrip().startswith("<")):
+                        log.warning("  !! Cached NSE cookies rejected — re-seeding session")
+                        warm = False
+                        seed(2)
+                        continue
+
                     if resp.status_code != 200:
-                        log.warning(f"  !! HTTP {resp.status_code} on attempt {attempt}")
+                        log.warning("  !! HTTP %s on attempt %d", resp.status_code, attempt)
                         time.sleep(3); continue
 
                     if len(body) == 0:
-                        log.warning(f"  !! Empty body on attempt {attempt}")
+                        log.warning("  !! Empty body on attempt %d", attempt)
                         time.sleep(3); continue
 
                     if preview.lstrip().startswith("<"):
-                        log.warning(f"  !! HTML returned (bot-blocked) on attempt {attempt}")
+                        log.warning("  !! HTML returned (bot-blocked) on attempt %d", attempt)
                         time.sleep(4); continue
 
                     try:
@@ -353,49 +534,49 @@ def fetch_from_nse() -> list:
                             io.StringIO(body.decode("utf-8", errors="replace"))
                         )
                         log.info(
-                            f"  ✅ [{deal_type}] CSV: {len(csv_df)} rows | "
-                            f"cols: {list(csv_df.columns)}"
+                            "  ✅ [%s] CSV: %d rows | cols: %s",
+                            deal_type, len(csv_df), list(csv_df.columns)
                         )
                         break
                     except Exception as csv_err:
-                        log.warning(f"  !! CSV parse error: {csv_err} — trying JSON fallback")
+                        log.warning("  !! CSV parse error: %s — trying JSON fallback", csv_err)
 
                     try:
-                        raw_json = resp.json()
+                        raw_json = orjson.loads(body) if orjson else json.loads(body)
                         if isinstance(raw_json, list) and raw_json:
                             csv_df = pd.DataFrame(raw_json)
                         elif isinstance(raw_json, dict):
-                            for key in ["data", "Data", "results", "records",
-                                        "bulkDeals", "blockDeals"]:
-                                val = raw_json.get(key)
-                                if isinstance(val, list) and val:
-                                    cols  = raw_json.get("columns")
-                                    csv_df = (
-                                        pd.DataFrame(val, columns=cols)
-                                        if (cols and not isinstance(val[0], dict))
-                                        else pd.DataFrame(val)
-                                    )
-                                    break
+                            val = next((v for k in NSE_JSON_KEYS
+                                        if isinstance(v := raw_json.get(k), list) and v),
+                                       None)
+                            if val is not None:
+                                cols   = raw_json.get("columns")
+                                csv_df = (
+                                    pd.DataFrame(val, columns=cols)
+                                    if (cols and not isinstance(val[0], dict))
+                                    else pd.DataFrame(val)
+                                )
                         if csv_df is not None and not csv_df.empty:
-                            log.info(f"  ✅ [{deal_type}] JSON fallback: {len(csv_df)} rows")
+                            log.info("  ✅ [%s] JSON fallback: %d rows", deal_type, len(csv_df))
                             break
                     except Exception as json_err:
-                        log.warning(f"  !! JSON fallback also failed: {json_err}")
+                        log.warning("  !! JSON fallback also failed: %s", json_err)
 
                     time.sleep(3)
 
                 except Exception as e:
-                    log.warning(f"  !! [{deal_type}] attempt {attempt} exception: {e}")
+                    log.warning("  !! [%s] attempt %d exception: %s", deal_type, attempt, e)
                     time.sleep(3)
 
             if csv_df is not None and not csv_df.empty:
                 csv_df["_deal_type"] = deal_type
                 all_dfs.append(csv_df)
-                log.info(f"  -> [{deal_type}] {len(csv_df)} rows queued")
+                log.info("  -> [%s] %d rows queued", deal_type, len(csv_df))
             else:
-                log.warning(f"  !! [{deal_type}] No usable data — skipping")
+                log.warning("  !! [%s] No usable data — skipping", deal_type)
 
-            time.sleep(1.5)
+        if all_dfs:
+            _save_nse_cookies(session_obj)
 
         if use_cffi and hasattr(session_obj, "close"):
             try: session_obj.close()
@@ -406,9 +587,9 @@ def fetch_from_nse() -> list:
             return []
 
         df = pd.concat(all_dfs, ignore_index=True)
-        log.info(f"  -> Combined: {df.shape[0]} rows from {len(all_dfs)} endpoint(s)")
+        log.info("  -> Combined: %d rows from %d endpoint(s)", df.shape[0], len(all_dfs))
         df.columns = [str(c).strip() for c in df.columns]
-        log.info(f"  -> Raw columns: {list(df.columns)}")
+        log.info("  -> Raw columns: %s", list(df.columns))
 
         NSE_EXACT = {
             "BD_SYMBOL":      "SYMBOL",
@@ -471,52 +652,23 @@ def fetch_from_nse() -> list:
                 rename[c] = "PRICE"; mapped.add("PRICE")
 
         df = df.rename(columns=rename)
-        log.info(f"  -> Normalised columns: {list(df.columns)}")
+        log.info("  -> Normalised columns: %s", list(df.columns))
 
         if "CLIENT" not in df.columns:
             log.warning("  ❌ CLIENT column missing after normalisation")
-            log.info(f"  -> All columns present: {list(df.columns)}")
+            log.info("  -> All columns present: %s", list(df.columns))
             return []
 
-        stocks, matched = {}, 0
-        for _, row in df.iterrows():
-            sym    = str(row.get("SYMBOL",  "")).strip().upper()
-            name   = str(row.get("COMPANY", sym)).strip()
-            client = str(row.get("CLIENT",  "")).strip().upper()
-            bs     = str(row.get("BUYSELL", "")).strip().upper()
-
-            if not sym or sym in ("NAN", "") or not client or client == "NAN":
-                continue
-
-            is_fii = any(k in client for k in FII_KW)
-            is_dii = any(k in client for k in DII_KW)
-            action = "buy" if bs.startswith("B") else "sell"
-
-            if sym not in stocks:
-                stocks[sym] = {
-                    "symbol":      sym + ".NS",
-                    "name":        name,
-                    "fii_cash":    "neutral",
-                    "dii_cash":    "neutral",
-                    "client_name": client,
-                }
-
-            if is_fii:
-                stocks[sym]["fii_cash"] = action
-                matched += 1
-            if is_dii:
-                stocks[sym]["dii_cash"] = action
-                matched += 1
-
-        result = list(stocks.values())
+        result, matched = _classify_deals(df)
         log.info(
-            f"  → Total rows={len(df)} | FII/DII matched={matched} | "
-            f"unique stocks={len(result)} (ALL included)"
+            "  → Total rows=%d | FII/DII matched=%d | "
+            "unique stocks=%d (ALL included)",
+            len(df), matched, len(result)
         )
         return result
 
     except Exception as e:
-        log.warning(f"  ❌ NSE fetch_from_nse error: {e}")
+        log.warning("  ❌ NSE fetch_from_nse error: %s", e)
         import traceback
         log.warning(traceback.format_exc())
         return []
@@ -529,40 +681,40 @@ def fetch_from_nse() -> list:
 def fetch_from_munafasutra() -> list:
     log.info("📡 [Source 2] MunafaSutra scraper...")
     try:
-        resp = requests.get("https://munafasutra.com/nse/FIIDII/",
-                            headers=BROWSER_HEADERS, timeout=20)
+        resp = HTTP.get("https://munafasutra.com/nse/FIIDII/",
+                        headers=BROWSER_HEADERS, timeout=20)
         resp.raise_for_status()
-        soup   = BeautifulSoup(resp.text, "lxml")
+        tree   = lxml.html.fromstring(resp.content)
         stocks = []
-        for a in soup.find_all("a", href=re.compile(r"/nse/stock/")):
+        for a in tree.xpath('//a[contains(@href, "/nse/stock/")]'):
             href   = a.get("href", "")
             symbol = href.rstrip("/").split("/")[-1]
-            name   = a.get_text(strip=True)
+            name   = "".join(t.strip() for t in a.itertext())
             if not symbol or not name:
                 continue
-            tr = a.find_parent("tr")
+            tr = a.xpath("ancestor::tr[1]")
             if not tr:
                 continue
-            row_text = " ".join(
-                t.get_text(" ", strip=True).lower() for t in tr.find_all("td")
-            )
+            row_text = " ".join(tr[0].xpath(".//td//text()")).lower()
             fii = "buy" if "bought" in row_text else "sell"
             dii = "buy" if "bought" in row_text else "sell"
             stocks.append({"symbol": symbol + ".NS", "name": name,
                            "fii_cash": fii, "dii_cash": dii})
-        log.info(f"  {'✅' if stocks else '❌'} MunafaSutra: {len(stocks)} stocks")
+        log.info("  %s MunafaSutra: %d stocks", "✅" if stocks else "❌", len(stocks))
         return stocks[:20]
     except Exception as e:
-        log.warning(f"  ❌ MunafaSutra: {e}")
+        log.warning("  ❌ MunafaSutra: %s", e)
         return []
 
 
-def fetch_fallback() -> list:
+def fetch_fallback() -> pd.DataFrame:
     log.warning("📡 [Source 3] Hardcoded fallback stocks")
-    return FALLBACK_STOCKS.copy()
+    return FALLBACK_DF.copy()   # cheap columnar copy — callers may mutate it
 
 
 def fetch_fii_dii_stocks():
+    """(deals, source) — records from the live sources, the fallback as a
+    DataFrame; build_dataset takes either."""
     s = fetch_from_nse()
     if s: return s, "NSE Bulk Deals CSV API"
     s = fetch_from_munafasutra()
@@ -581,17 +733,188 @@ def fix_df(df):
     return df
 
 
-def compute_technicals(symbol: str) -> dict:
-    log.info(f"  📐 {symbol}")
+# pandas' ewm() alpha for com= / span= (same expression, so results match bit for bit)
+_A_RSI   = 1.0 / (1.0 + 13)
+_A_EMA12 = 1.0 / (1.0 + (12 - 1) / 2.0)
+_A_EMA26 = 1.0 / (1.0 + (26 - 1) / 2.0)
+_A_SIG9  = 1.0 / (1.0 + (9 - 1) / 2.0)
+_A_EMA20 = 1.0 / (1.0 + (20 - 1) / 2.0)
+_A_EMA50 = 1.0 / (1.0 + (50 - 1) / 2.0)
+
+# Explicit signatures make njit compile eagerly at import — or, on a warm
+# .cache/numba, load the cache=True machine code — so no JIT pause lands
+# mid-build.
+@njit("UniTuple(f8, 2)(f8, f8, f8, f8)", cache=True, error_model="numpy")
+def _ewm_step(avg, wt, x, alpha):
+    """One step of pandas ewm(adjust=False).mean() — a NaN observation keeps
+    the average but decays the old weight, exactly as pandas does."""
+    if avg != avg:
+        return x, 1.0
+    if x != x:
+        return avg, wt * (1.0 - alpha)
+    wt *= 1.0 - alpha
+    if avg != x:
+        avg = (wt * avg + alpha * x) / (wt + alpha)
+    return avg, 1.0
+
+
+@njit("UniTuple(f8, 8)(f8[::1], f8[::1], f8[::1])", cache=True, error_model="numpy")
+def _indicators(c, h, lo):
+    """RSI(14), MACD(12,26,9), EMA20/50, ADX(14) recurrences in one pass over
+    the closes, then the Bollinger(20) and StochRSI(14) windows at the end.
+    Returns (rsi, macd_hist, ema20, ema50, bb_mid, bb_sd, adx, stoch_rsi)."""
+    n   = len(c)
+    nan = np.nan
+    rsi = np.empty(n)
+    ag = al = pdm = mdm = atr = dx = nan
+    e12 = e26 = sig = e20 = e50 = nan
+    w_ag = w_al = w_pdm = w_mdm = w_atr = w_dx = 1.0
+    w12 = w26 = w_sig = w20 = w50 = 1.0
+
+    # True range as one array op; bar 0 has no previous close -> high - low
+    tr_a     = np.empty(n)
+    tr_a[0]  = h[0] - lo[0]
+    tr_a[1:] = np.maximum(h[1:] - lo[1:],
+                          np.maximum(np.abs(h[1:] - c[:-1]), np.abs(lo[1:] - c[:-1])))
+
+    for i in range(n):
+        if i:
+            d  = c[i] - c[i - 1]
+            up = h[i] - h[i - 1]
+            dn = lo[i - 1] - lo[i]
+            g, l = max(d, 0.0), max(-d, 0.0)
+            pm, mm = max(up, 0.0), max(dn, 0.0)
+        else:
+            g = l = pm = mm = nan
+
+        ag,  w_ag  = _ewm_step(ag,  w_ag,  g,  _A_RSI)
+        al,  w_al  = _ewm_step(al,  w_al,  l,  _A_RSI)
+        rsi[i] = nan if al == 0 else 100 - (100 / (1 + ag / al))
+
+        e12, w12   = _ewm_step(e12, w12,   c[i], _A_EMA12)
+        e26, w26   = _ewm_step(e26, w26,   c[i], _A_EMA26)
+        sig, w_sig = _ewm_step(sig, w_sig, e12 - e26, _A_SIG9)
+        e20, w20   = _ewm_step(e20, w20,   c[i], _A_EMA20)
+        e50, w50   = _ewm_step(e50, w50,   c[i], _A_EMA50)
+
+        pdm, w_pdm = _ewm_step(pdm, w_pdm, pm, _A_RSI)
+        mdm, w_mdm = _ewm_step(mdm, w_mdm, mm, _A_RSI)
+        atr, w_atr = _ewm_step(atr, w_atr, tr_a[i], _A_RSI)
+        pdi = 100 * pdm / atr
+        mdi = 100 * mdm / atr
+        dsum = pdi + mdi
+        dx, w_dx = _ewm_step(dx, w_dx,
+                             nan if dsum == 0 else 100 * abs(pdi - mdi) / dsum,
+                             _A_RSI)
+
+    # Only the last value of each rolling window is used, so reduce just the
+    # tail slice (array ops — also fast when the kernel runs uncompiled)
+    # Bollinger(20): mean / sample std of the last 20 closes
+    bm = bsd = nan
+    if n >= 20:
+        win = c[n - 20:]
+        bm  = win.sum() / 20
+        bsd = np.sqrt(((win - bm) ** 2).sum() / 19)
+
+    # StochRSI over the last 14 RSI values (NaN anywhere in the window -> NaN)
+    sv = nan
+    if n >= 14:
+        win = rsi[n - 14:]
+        if not np.isnan(win).any():
+            mn, mx = win.min(), win.max()
+            if mx != mn:
+                sv = (rsi[n - 1] - mn) / (mx - mn)
+
+    return rsi[n - 1], e12 - e26 - sig, e20, e50, bm, bsd, dx, sv
+
+
+def _download(symbols, start, end):
+    """ONE batched yfinance call (threaded internally), grouped by ticker."""
+    try:
+        return yf.download(list(symbols), start=start, end=end,
+                           group_by="ticker", threads=True,
+                           progress=False, auto_adjust=True)
+    except Exception as e:
+        log.warning("Batched history download failed: %s", e)
+        return None
+
+
+def _read_cached(symbol):
+    if pyarrow is None:
+        return None
+    try:
+        df = pd.read_parquet(HISTORY_CACHE / f"{symbol}.parquet")
+    except Exception:
+        return None
+    return df if len(df) >= 2 else None
+
+
+def download_history(symbols) -> dict:
+    """~6 months of daily OHLCV per symbol — {symbol: DataFrame}.
+
+    Symbols with a parquet cache only fetch bars from their second-to-last
+    cached day on.  That day is complete, so if Yahoo now reports a different
+    close for it the series was re-adjusted (dividend/split) and the symbol is
+    fetched in full instead.  Each group is a single batched download.
+    """
+    end    = datetime.today()
+    start  = end - timedelta(days=HISTORY_DAYS)
+    cached = {s: df for s in symbols if (df := _read_cached(s)) is not None}
+    out    = {}
+
+    if cached:
+        fresh = _download(cached, min(df.index[-2] for df in cached.values()), end)
+        for sym, old in cached.items():
+            new = _ticker_frame(fresh, sym)
+            if new is None:
+                continue
+            new   = new.dropna(how="all")
+            check = old.index[-2]
+            if (check in new.index and
+                    np.isclose(new.at[check, "Close"], old.at[check, "Close"],
+                               rtol=1e-6)):
+                out[sym] = pd.concat([old[old.index < new.index[0]], new])
+        log.info("  -> History cache: %d/%d symbols refreshed incrementally",
+                 len(out), len(cached))
+
+    cold = [s for s in symbols if s not in out]
+    if cold:
+        bulk = _download(cold, start, end)
+        for sym in cold:
+            df = _ticker_frame(bulk, sym)
+            if df is not None:
+                out[sym] = df
+
+    keep_from = pd.Timestamp(start.date())
+    for sym, df in out.items():
+        out[sym] = df = df[df.index >= keep_from]
+        if pyarrow is not None and not df.dropna(how="all").empty:
+            try:
+                HISTORY_CACHE.mkdir(parents=True, exist_ok=True)
+                df.to_parquet(HISTORY_CACHE / f"{sym}.parquet")
+            except Exception as e:
+                log.warning("  -> History cache write failed for %s: %s", sym, e)
+    return out
+
+
+def _ticker_frame(bulk, symbol):
+    """One symbol's frame out of a group_by="ticker" download."""
+    if bulk is None or bulk.empty:
+        return None
+    if isinstance(bulk.columns, pd.MultiIndex):
+        if symbol not in bulk.columns.get_level_values(0):
+            return None
+        return bulk[symbol]
+    return bulk   # single-ticker download came back flat
+
+
+def _compute_from_df(df, symbol: str) -> dict:
+    log.info("  📐 %s", symbol)
     empty = dict(rsi=50.0, macd_hist=0.0, ema_cross="unknown", bb_label="N/A",
                  adx=0.0, stoch_rsi=0.5, resist1=0.0, support1=0.0,
                  swing_high=0.0, swing_low=0.0, last_price=0.0,
                  overall="N/A", score=0, sparkline=[], data_ok=False)
     try:
-        end   = datetime.today()
-        start = end - timedelta(days=185)
-        df    = yf.download(symbol, start=start, end=end,
-                            progress=False, auto_adjust=True)
         if df is None or df.empty:
             raise ValueError("Empty data")
         df = fix_df(df)
@@ -599,66 +922,32 @@ def compute_technicals(symbol: str) -> dict:
         if len(df) < 25:
             raise ValueError(f"Only {len(df)} rows")
 
-        c  = df["Close"].astype(float)
-        h  = df["High"].astype(float)
-        lo = df["Low"].astype(float)
-        lc = float(c.iloc[-1])
-
-        # RSI(14)
-        dlt  = c.diff()
-        gain = dlt.clip(lower=0)
-        loss = (-dlt).clip(lower=0)
-        ag   = gain.ewm(com=13, adjust=False).mean()
-        al   = loss.ewm(com=13, adjust=False).mean()
-        rsi_s= 100 - (100 / (1 + ag / al.replace(0, np.nan)))
-        rsi  = round(float(rsi_s.iloc[-1]), 1)
-
-        # MACD(12,26,9)
-        macd  = (c.ewm(span=12, adjust=False).mean()
-                 - c.ewm(span=26, adjust=False).mean())
-        mhist = round(float(
-            (macd - macd.ewm(span=9, adjust=False).mean()).iloc[-1]
-        ), 2)
-
-        # EMA 20/50
-        ema20  = c.ewm(span=20, adjust=False).mean()
-        ema50  = c.ewm(span=50, adjust=False).mean()
-        ecross = "bullish" if float(ema20.iloc[-1]) > float(ema50.iloc[-1]) else "bearish"
+        c  = df["Close"].to_numpy(dtype=np.float64, copy=True)   # writable, C-contiguous
+        h  = df["High"].to_numpy(dtype=np.float64, copy=True)
+        lo = df["Low"].to_numpy(dtype=np.float64, copy=True)
+        lc = float(c[-1])
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsi, mhist, e20, e50, bm, bsd, adx, sv = _indicators(c, h, lo)
+        rsi    = round(float(rsi), 1)
+        mhist  = round(float(mhist), 2)
+        ecross = "bullish" if e20 > e50 else "bearish"
+        adx    = round(float(adx), 1)
+        sv     = 0.5 if np.isnan(sv) else round(float(sv), 2)
 
         # Bollinger Bands
-        bm  = c.rolling(20).mean()
-        bsd = c.rolling(20).std()
-        bu  = float((bm + 2*bsd).iloc[-1])
-        bl2 = float((bm - 2*bsd).iloc[-1])
+        bu  = float(bm + 2*bsd)
+        bl2 = float(bm - 2*bsd)
         bp  = (lc - bl2) / ((bu - bl2) or 1)
         bbl = "Overbought" if bp > 0.8 else ("Oversold" if bp < 0.2 else "Mid")
 
-        # ADX(14)
-        pdm = h.diff().clip(lower=0)
-        mdm = (-lo.diff()).clip(lower=0)
-        tr  = pd.concat(
-            [h-lo, (h-c.shift()).abs(), (lo-c.shift()).abs()], axis=1
-        ).max(axis=1)
-        atr = tr.ewm(com=13, adjust=False).mean()
-        pdi = 100 * pdm.ewm(com=13, adjust=False).mean() / atr
-        mdi = 100 * mdm.ewm(com=13, adjust=False).mean() / atr
-        dx  = 100 * (pdi-mdi).abs() / (pdi+mdi).replace(0, np.nan)
-        adx = round(float(dx.ewm(com=13, adjust=False).mean().iloc[-1]), 1)
-
-        # Stoch RSI
-        srsi = ((rsi_s - rsi_s.rolling(14).min()) /
-                (rsi_s.rolling(14).max() - rsi_s.rolling(14).min())
-                .replace(0, np.nan))
-        sv = float(srsi.iloc[-1])
-        sv = 0.5 if np.isnan(sv) else round(sv, 2)
-
         # Pivot S/R
         n  = min(120, len(h))
-        pv = (float(h.iloc[-1]) + float(lo.iloc[-1]) + lc) / 3
-        r1 = round(2*pv - float(lo.iloc[-1]), 2)
-        s1 = round(2*pv - float(h.iloc[-1]),  2)
-        sh = round(float(h.rolling(n).max().iloc[-1]),  2)
-        sl = round(float(lo.rolling(n).min().iloc[-1]), 2)
+        pv = (float(h[-1]) + float(lo[-1]) + lc) / 3
+        r1 = round(2*pv - float(lo[-1]), 2)
+        s1 = round(2*pv - float(h[-1]),  2)
+        sh = round(float(h[-n:].max()),  2)
+        sl = round(float(lo[-n:].min()), 2)
 
         # Signal score
         sc = 0
@@ -673,13 +962,13 @@ def compute_technicals(symbol: str) -> dict:
               else "CAUTION" if sc >= -2
               else "SELL")
 
-        spark = [round(float(x), 2) for x in c.iloc[-7:].tolist()]
+        spark = np.round(c[-7:], 2).tolist()
         return dict(rsi=rsi, macd_hist=mhist, ema_cross=ecross, bb_label=bbl,
                     adx=adx, stoch_rsi=sv, resist1=r1, support1=s1,
                     swing_high=sh, swing_low=sl, last_price=round(lc, 2),
                     overall=ov, score=sc, sparkline=spark, data_ok=True)
     except Exception as e:
-        log.warning(f"    ⚠️  {symbol}: {e}")
+        log.warning("    ⚠️  %s: %s", symbol, e)
         return empty
 
 
@@ -690,13 +979,15 @@ def compute_technicals(symbol: str) -> dict:
 def fetch_market_summary() -> dict:
     log.info("📡 Nifty / Sensex...")
     try:
+        # Both indices in one batched download
+        bulk = yf.download(["^NSEI", "^BSESN"], period="5d", group_by="ticker",
+                           threads=True, progress=False, auto_adjust=True)
+
         def load(sym):
-            df = yf.download(sym, period="5d", progress=False, auto_adjust=True)
-            df = fix_df(df)
-            c  = df["Close"].dropna().astype(float)
+            c = _ticker_frame(bulk, sym)["Close"].dropna().to_numpy(dtype=np.float64)
             return (
-                round(float(c.iloc[-1]), 2),
-                round(float((c.iloc[-1]-c.iloc[-2])/c.iloc[-2]*100), 2)
+                round(float(c[-1]), 2),
+                round(float((c[-1]-c[-2])/c[-2]*100), 2)
                 if len(c) >= 2 else 0.0
             )
         np_, nc = load("^NSEI")
@@ -704,7 +995,7 @@ def fetch_market_summary() -> dict:
         return dict(nifty_price=np_, nifty_chg=nc,
                     sensex_price=sp_, sensex_chg=sc)
     except Exception as e:
-        log.warning(f"Market summary failed: {e}")
+        log.warning("Market summary failed: %s", e)
         return dict(nifty_price=0, nifty_chg=0, sensex_price=0, sensex_chg=0)
 
 
@@ -714,27 +1005,34 @@ def fetch_market_summary() -> dict:
 
 def build_dataset():
     raw, source = fetch_fii_dii_stocks()
-    log.info(f"✅ Source: '{source}' — {len(raw)} stocks")
-    market   = fetch_market_summary()
+    log.info("✅ Source: '%s' — %d stocks", source, len(raw))
+    market = fetch_market_summary()
+
+    # Institutional signal for every stock at once, on the columns
+    deals    = raw if isinstance(raw, pd.DataFrame) else pd.DataFrame(raw)
+    fii, dii = deals["fii_cash"], deals["dii_cash"]
+    both_buy = (fii == "buy")  & (dii == "buy")
+    fii_only = (fii == "buy")  & (dii != "buy")
+    dii_only = (dii == "buy")  & (fii != "buy")
+    both_sel = (fii == "sell") & (dii == "sell")
+    neither  = (fii == "neutral") & (dii == "neutral")
+    inst_sig = np.select(
+        [both_buy, fii_only, dii_only, both_sel, neither],
+        ["BOTH BUY", "FII BUY", "DII BUY", "BOTH SELL", "BULK/BLOCK"],
+        default="SELL",
+    ).tolist()
+
+    history  = download_history(list(dict.fromkeys(deals["symbol"])))
     enriched = []
-    for s in raw:
-        tech     = compute_technicals(s["symbol"])
-        both_buy = s["fii_cash"] == "buy"  and s["dii_cash"] == "buy"
-        fii_only = s["fii_cash"] == "buy"  and s["dii_cash"] != "buy"
-        dii_only = s["dii_cash"] == "buy"  and s["fii_cash"] != "buy"
-        both_sel = s["fii_cash"] == "sell" and s["dii_cash"] == "sell"
-        neither  = s["fii_cash"] == "neutral" and s["dii_cash"] == "neutral"
-        inst_sig = ("BOTH BUY"   if both_buy else
-                    "FII BUY"    if fii_only  else
-                    "DII BUY"    if dii_only  else
-                    "BOTH SELL"  if both_sel  else
-                    "BULK/BLOCK" if neither   else "SELL")
+    for s, sig, bb, fo, do in zip(deals.to_dict("records"), inst_sig,
+                                  both_buy.tolist(), fii_only.tolist(),
+                                  dii_only.tolist()):
+        tech = _compute_from_df(history.get(s["symbol"]), s["symbol"])
         enriched.append({**s, **tech,
-                         "inst_signal": inst_sig,
-                         "both_buy":    both_buy,
-                         "fii_only":    fii_only,
-                         "dii_only":    dii_only})
-        time.sleep(0.4)
+                         "inst_signal": sig,
+                         "both_buy":    bb,
+                         "fii_only":    fo,
+                         "dii_only":    do})
     return enriched, market, source
 
 
@@ -853,6 +1151,9 @@ SECTOR_MAP = {
     "GSFC":"Agri & Fertilisers","NFL":"Agri & Fertilisers",
     "RALLIS":"Agri & Fertilisers","BAYER":"Agri & Fertilisers",
 }
+# Interned keys let get_sector() hit the identity fast path; read-only view
+# guards the shared table against accidental mutation.
+SECTOR_MAP = MappingProxyType({sys.intern(k): v for k, v in SECTOR_MAP.items()})
 
 SECTOR_ICONS = {
     "Banking & Finance":           "🏦",
@@ -890,7 +1191,7 @@ SIGNAL_ORDER = {
 
 
 def get_sector(symbol: str) -> str:
-    sym = symbol.replace(".NS", "").strip().upper()
+    sym = sys.intern(symbol.replace(".NS", "").strip().upper())
     return SECTOR_MAP.get(sym, "Others")
 
 
@@ -898,29 +1199,21 @@ def get_sector(symbol: str) -> str:
 #  HTML HELPERS  — Stealth Slate Theme
 # ─────────────────────────────────────────────────────────────────────────────
 
-def spark_svg(prices):
-    """Mini bar-chart sparkline — teal/red palette matching Stealth Slate."""
+_SPARK_W, _SPARK_H = 72, 22
+
+
+def spark_canvas(prices, series):
+    """Sparkline placeholder — queues [up, bar heights…] for the page-level
+    JSON blob and returns the <canvas> the client-side script draws into."""
     if len(prices) < 2:
         return ""
-    mn, mx = min(prices), max(prices)
-    rng = mx - mn or 1
-    w, h = 72, 22
-    # Bar chart style matching the screenshot
-    bar_w = max(1, w // len(prices) - 1)
-    bars = ""
-    up = prices[-1] >= prices[0]
-    for i, p in enumerate(prices):
-        bar_h = max(2, round((p - mn) / rng * h))
-        x = i * (w // len(prices))
-        y = h - bar_h
-        col = "#10b981" if up else "#ef4444"
-        bars += f'<rect x="{x}" y="{y}" width="{bar_w}" height="{bar_h}" fill="{col}" rx="1"/>'
-    return (
-        f'<svg width="{w}" height="{h}" viewBox="0 0 {w} {h}" '
-        f'xmlns="http://www.w3.org/2000/svg" style="display:block">'
-        f'{bars}'
-        f'</svg>'
-    )
+    p   = np.asarray(prices, dtype=np.float64)
+    mn  = p.min()
+    rng = (p.max() - mn) or 1
+    bars = np.maximum(2, np.round((p - mn) / rng * _SPARK_H)).astype(int)
+    series.append([int(p[-1] >= p[0]), *bars.tolist()])
+    return (f'<canvas class="spark" width="{_SPARK_W}" height="{_SPARK_H}" '
+            f'data-id="{len(series) - 1}"></canvas>')
 
 
 def rsi_class(v):
@@ -930,244 +1223,98 @@ def rsi_class(v):
     return "rsi-warm"
 
 
-def sig_class(overall):
-    """Map overall signal → Stealth Slate CSS badge class."""
-    return {
-        "STRONG BUY": "sig-sb",
-        "BUY":        "sig-buy",
-        "NEUTRAL":    "sig-neutral",
-        "CAUTION":    "sig-caution",
-        "SELL":       "sig-sell",
-        "BOTH SELL":  "sig-sell",
-        "BULK/BLOCK": "sig-blk",
-        "N/A":        "sig-neutral",
-    }.get(overall, "sig-neutral")
+# Overall signal → badge class / pill label, built once at import
+_SIG_CLASS = {
+    "STRONG BUY": "sig-sb",
+    "BUY":        "sig-buy",
+    "NEUTRAL":    "sig-neutral",
+    "CAUTION":    "sig-caution",
+    "SELL":       "sig-sell",
+    "BOTH SELL":  "sig-sell",
+    "BULK/BLOCK": "sig-blk",
+    "N/A":        "sig-neutral",
+}
+_SIG_LABEL = {
+    "STRONG BUY": "⚡ STRONG BUY",
+    "BUY":        "▲ BUY",
+    "SELL":       "▼ SELL",
+    "BOTH SELL":  "▼ SELL",
+    "CAUTION":    "⚠ CAUTION",
+    "BULK/BLOCK": "■ BULK/BLOCK",
+}
 
 
+@lru_cache(maxsize=4096)
 def fmt_price(v):
     return f"&#8377;{v:,.2f}" if v else "N/A"
 
 
-def fmt_macd(v):
-    sign = "+" if v >= 0 else ""
-    cls  = "macd-pos" if v >= 0 else "macd-neg"
-    return f'<span class="{cls}">{sign}{v:.2f}</span>'
-
-
-def fmt_ema(cross):
-    if cross == "bullish":
-        return '<span class="ema-bull">EMA ▲</span>'
-    return '<span class="ema-bear">EMA ▼</span>'
-
-
-# ─────────────────────────────────────────────────────────────────────────────
-#  GENERATE HTML  —  Stealth Slate Theme
-# ─────────────────────────────────────────────────────────────────────────────
-
-def generate_html(stocks, market, date_str, source, date_range_label="") -> str:
+# Two-way picks indexed by a bool (False → 0, True → 1) instead of branching
+_UPDN      = ("dn", "up")
+_ARROW     = ("▼", "▲")
+_PRICE_DIR = ("price-dn", "price-up")
+_MACD_OPEN = ('<span class="macd-neg">', '<span class="macd-pos">+')
+_EMA_SPAN  = ('<span class="ema-bear">EMA ▼</span>',
+              '<span class="ema-bull">EMA ▲</span>')
 
-    # ── Market direction helpers ──────────────────────────────────────────────
-    nc  = "up"  if market["nifty_chg"]  >= 0 else "dn"
-    xc  = "up"  if market["sensex_chg"] >= 0 else "dn"
-    na  = "▲"   if market["nifty_chg"]  >= 0 else "▼"
-    xa  = "▲"   if market["sensex_chg"] >= 0 else "▼"
 
-    # ── Counts ────────────────────────────────────────────────────────────────
-    fb  = sum(1 for s in stocks if s["fii_cash"] == "buy")
-    db  = sum(1 for s in stocks if s["dii_cash"] == "buy")
-    bb  = sum(1 for s in stocks if s["both_buy"])
-    st  = sum(1 for s in stocks if s["overall"] == "STRONG BUY")
-    sel = sum(1 for s in stocks if s["overall"] in ("SELL", "BOTH SELL"))
-
-    # ── Sector grouping + sorting ─────────────────────────────────────────────
-    for s in stocks:
-        s["sector"] = get_sector(s["symbol"])
-
-    from collections import defaultdict
-    sector_groups = defaultdict(list)
-    for s in stocks:
-        sector_groups[s["sector"]].append(s)
-
-    def signal_sort_key(s):
-        return SIGNAL_ORDER.get(s.get("overall", "N/A"), 5)
-
-    for sec in sector_groups:
-        sector_groups[sec].sort(key=signal_sort_key)
-
-    def sector_best(items):
-        return min(SIGNAL_ORDER.get(s.get("overall", "N/A"), 5) for s in items)
-
-    sorted_sectors = sorted(
-        sector_groups.items(), key=lambda kv: sector_best(kv[1])
-    )
-
-    # ── Sidebar sector list ───────────────────────────────────────────────────
-    sidebar_items = ""
-    for sector_name, sec_stocks in sorted_sectors:
-        icon       = SECTOR_ICONS.get(sector_name, "🔷")
-        best_sig   = min(sec_stocks, key=signal_sort_key)["overall"]
-        if best_sig in ("STRONG BUY", "BUY", "BOTH BUY"):
-            sig_cls, sig_lbl = "buy",  "↑ BUY"
-        elif best_sig in ("SELL", "BOTH SELL"):
-            sig_cls, sig_lbl = "sell", "↓ SELL"
-        else:
-            sig_cls, sig_lbl = "hold", "→ HOLD"
-        anchor = sector_name.replace(" ", "_").replace("&", "and")
-        sidebar_items += f"""
-        <a href="#{anchor}" class="sb-item">
-          <div>
-            <div class="sb-item-name">{icon} {sector_name}</div>
-            <div class="sb-item-count">{len(sec_stocks)} securities</div>
-          </div>
-          <span class="sb-item-sig {sig_cls}">{sig_lbl}</span>
-        </a>"""
-
-    # ── Sector card rows ──────────────────────────────────────────────────────
-    sector_cards = ""
+def fmt_macd(v):
+    return f"{_MACD_OPEN[v >= 0]}{v:.2f}</span>"
 
-    for sector_name, sec_stocks in sorted_sectors:
-        icon      = SECTOR_ICONS.get(sector_name, "🔷")
-        anchor    = sector_name.replace(" ", "_").replace("&", "and")
-        sec_count = len(sec_stocks)
-        sec_sb    = sum(1 for s in sec_stocks if s["overall"] == "STRONG BUY")
-        sec_buy   = sum(1 for s in sec_stocks if s["overall"] == "BUY")
-        sec_sell  = sum(1 for s in sec_stocks if s["overall"] in ("SELL", "BOTH SELL"))
 
-        # Sector header pills
-        header_pills = ""
-        if sec_sb:
-            header_pills += f'<span class="hdr-pill sb">⚡ {sec_sb} Strong Buy</span>'
-        if sec_buy:
-            header_pills += f'<span class="hdr-pill buy">▲ {sec_buy} Buy</span>'
-        if sec_sell:
-            header_pills += f'<span class="hdr-pill sell">▼ {sec_sell} Sell</span>'
+def fmt_ema(cross):
+    return _EMA_SPAN[cross == "bullish"]
 
-        # Build stock rows for this sector card
-        stock_rows = ""
-        for s in sec_stocks:
-            sym         = s["symbol"].replace(".NS", "")
-            price       = fmt_price(s["last_price"]) if s["last_price"] > 0 else "—"
-            spk         = spark_svg(s.get("sparkline", []))
-            rsi_v       = s["rsi"]
-            rsi_cls     = rsi_class(rsi_v)
-            macd_h      = fmt_macd(s["macd_hist"])
-            ema_h       = fmt_ema(s["ema_cross"])
-            overall     = s["overall"]
-            sig_cls_val = sig_class(overall)
-            is_up       = s.get("sparkline") and len(s["sparkline"]) >= 2 and s["sparkline"][-1] >= s["sparkline"][0]
 
-            # Signal label
-            if overall == "STRONG BUY":
-                sig_label = "⚡ STRONG BUY"
-            elif overall == "BUY":
-                sig_label = "▲ BUY"
-            elif overall in ("SELL", "BOTH SELL"):
-                sig_label = "▼ SELL"
-            elif overall == "CAUTION":
-                sig_label = "⚠ CAUTION"
-            elif overall == "BULK/BLOCK":
-                sig_label = "■ BULK/BLOCK"
-            else:
-                sig_label = "— NEUTRAL"
+_RE_CSS_COMMENT  = re.compile(r"/\*.*?\*/", re.S)
+_RE_CSS_SPACE    = re.compile(r"\s+")
+_RE_CSS_PUNCT    = re.compile(r"\s*([{};,>])\s*")
+_RE_HTML_COMMENT = re.compile(r"<!--.*?-->", re.S)
+_RE_HTML_INDENT  = re.compile(r"\n\s*")
 
-            price_dir_cls = "price-up" if is_up else "price-dn"
 
-            stock_rows += f"""
-            <tr class="stock-row">
-              <td class="td-stock">
-                <div class="stock-name">{s['name']}</div>
-                <div class="stock-sym">{sym}</div>
-              </td>
-              <td class="td-r">
-                <div class="price-val {price_dir_cls}">{price}</div>
-                <div class="spark-wrap">{spk}</div>
-              </td>
-              <td class="td-c">
-                <div class="rsi-badge {rsi_cls}">{rsi_v}</div>
-                <div class="rsi-track">
-                  <div class="rsi-fill {rsi_cls}" style="width:{min(rsi_v,100):.0f}%"></div>
-                </div>
-              </td>
-              <td class="td-c">
-                <div class="sr-grid">
-                  <div class="sr-row"><span class="sr-tag r">R1</span><span class="sr-val r">{fmt_price(s['resist1'])}</span></div>
-                  <div class="sr-row"><span class="sr-tag s">S1</span><span class="sr-val s">{fmt_price(s['support1'])}</span></div>
-                  <div class="sr-row"><span class="sr-tag r">6mH</span><span class="sr-val r">{fmt_price(s['swing_high'])}</span></div>
-                  <div class="sr-row"><span class="sr-tag s">6mL</span><span class="sr-val s">{fmt_price(s['swing_low'])}</span></div>
-                </div>
-              </td>
-              <td class="td-c">
-                <div class="macd-val">{macd_h}</div>
-                <div class="ema-val">{ema_h}</div>
-              </td>
-              <td class="td-c">
-                <span class="sig-pill {sig_cls_val}">{sig_label}</span>
-              </td>
-            </tr>"""
-
-        sector_cards += f"""
-        <div class="sector-card" id="{anchor}">
-          <div class="sec-card-hdr">
-            <div class="sec-card-left">
-              <span class="sec-icon">{icon}</span>
-              <span class="sec-card-name">{sector_name}</span>
-              <span class="sec-count-badge">{sec_count} securities</span>
-            </div>
-            <div class="sec-hdr-pills">{header_pills}</div>
-          </div>
-          <div class="sec-table-wrap">
-            <table class="sec-table">
-              <thead>
-                <tr>
-                  <th>SECURITY</th>
-                  <th class="th-r">PRICE / TREND</th>
-                  <th class="th-c">RSI (14)</th>
-                  <th class="th-c">S/R LEVELS</th>
-                  <th class="th-c">MACD / EMA</th>
-                  <th class="th-c">SIGNAL</th>
-                </tr>
-              </thead>
-              <tbody>{stock_rows}</tbody>
-            </table>
-          </div>
-        </div>"""
+def minify_css(css):
+    """Strip comments and whitespace; one rule per line keeps SMTP-safe line lengths.
+    Runs once at import — rcssmin when installed, the regexes below otherwise."""
+    if rcssmin is not None:
+        css = rcssmin.cssmin(css)
+    else:
+        css = _RE_CSS_COMMENT.sub("", css)
+        css = _RE_CSS_SPACE.sub(" ", css)
+        css = _RE_CSS_PUNCT.sub(r"\1", css)
+    return css.replace(";}", "}").replace("}", "}\n").strip()
+
+
+def minify_html(html):
+    """Drop comments, indentation and blank lines — rendering is unchanged."""
+    html = _RE_HTML_COMMENT.sub("", html)
+    return _RE_HTML_INDENT.sub("\n", html)
+
+
+def minify_html_iter(chunks):
+    """minify_html over a chunk stream — same output as minifying the joined
+    text, provided no comment straddles two chunks. _STYLE_SLOT passes through."""
+    at_eol = False
+    for chunk in chunks:
+        if chunk is _STYLE_SLOT:
+            at_eol = False   # both style variants start with "<" and end in ">"
+            yield chunk
+            continue
+        chunk = minify_html(chunk)
+        if at_eol:
+            chunk = chunk.lstrip()
+        if chunk:
+            at_eol = chunk[-1] == "\n"
+            yield chunk
 
-    # ── IST timestamp ─────────────────────────────────────────────────────────
-    IST = pytz.timezone("Asia/Kolkata")
-    now_ist = datetime.now(IST).strftime("%d-%b-%Y %H:%M IST")
 
-    # ── Ticker tape ───────────────────────────────────────────────────────────
-    ticker_items = [
-        ("NIFTY 50",
-         f"&#8377;{market['nifty_price']:,.2f}",
-         "up" if market["nifty_chg"] >= 0 else "dn",
-         f"{'▲' if market['nifty_chg']>=0 else '▼'}{abs(market['nifty_chg']):.2f}%"),
-        ("SENSEX",
-         f"&#8377;{market['sensex_price']:,.2f}",
-         "up" if market["sensex_chg"] >= 0 else "dn",
-         f"{'▲' if market['sensex_chg']>=0 else '▼'}{abs(market['sensex_chg']):.2f}%"),
-        ("TRACKED",   str(len(stocks)), "up",  f"FII:{fb} · DII:{db}"),
-        ("BOTH BUY",  str(bb),          "up",  "securities"),
-        ("STRONG BUY",str(st),          "up",  "signals"),
-        ("SELL ALERT",str(sel),         "dn" if sel > 0 else "up", "caution"),
-        ("SOURCE",    source[:20],      "up",  "NSE CSV"),
-        ("RANGE",     date_range_label, "up",  "window"),
-    ]
-    ticker_html = ""
-    for sym, val, cls, extra in ticker_items:
-        ticker_html += (
-            f'<div class="t-item">'
-            f'<span class="t-sym">{sym}</span>'
-            f'<span class="t-val {cls}">{val}</span>'
-            f'<span class="t-extra">{extra}</span>'
-            f'</div>'
-        )
-    ticker_html = ticker_html * 2  # duplicate for seamless scroll
+# ─────────────────────────────────────────────────────────────────────────────
+#  CSS — Stealth Slate Theme
+# ─────────────────────────────────────────────────────────────────────────────
 
-    # ══════════════════════════════════════════════════════════════════════════
-    #  CSS — Stealth Slate Theme
-    # ══════════════════════════════════════════════════════════════════════════
-    css = """
+# Critical rules (header, ticker, stats bar, grid) are inlined in <head> so the
+# first paint is styled; everything below the fold ships as styles.css.
+_CRITICAL_CSS = """
 @import url('https://fonts.googleapis.com/css2?family=DM+Sans:wght@300;400;500;600;700&family=DM+Mono:wght@400;500&display=swap');
 
 /* ═══════════════════════════════════════════════════════
@@ -1270,7 +1417,7 @@ header{
   display:flex;align-items:center;
   font-size:11px;font-weight:600;letter-spacing:.5px;text-transform:uppercase;
   color:var(--text3);
-  cursor:pointer;transition:all .15s;white-space:nowrap;
+  cursor:pointer;transition:color .15s,background-color .15s;white-space:nowrap;
   position:relative;text-decoration:none;border-bottom:2px solid transparent;
 }
 .h-tab:hover{color:var(--text);background:rgba(255,255,255,.03)}
@@ -1293,6 +1440,7 @@ header{
   width:7px;height:7px;border-radius:50%;background:var(--teal);
   box-shadow:0 0 6px var(--teal),0 0 12px rgba(16,185,129,.4);
   animation:blink 2s ease-in-out infinite;
+  will-change:opacity;
 }
 @keyframes blink{0%,100%{opacity:1}50%{opacity:.25}}
 
@@ -1305,6 +1453,7 @@ header{
 .ticker-inner{
   display:inline-flex;white-space:nowrap;
   animation:scroll-ticker 60s linear infinite;
+  will-change:transform;
 }
 @keyframes scroll-ticker{from{transform:translateX(0)}to{transform:translateX(-50%)}}
 .t-item{
@@ -1350,6 +1499,25 @@ header{
 /* ── LAYOUT ── */
 .main{display:grid;grid-template-columns:240px 1fr;flex:1}
 
+/* ── RESPONSIVE (above the fold) ── */
+@media(max-width:1100px){
+  .main{grid-template-columns:200px 1fr}
+  .stat-val{font-size:22px}
+  .stats-bar{grid-template-columns:repeat(3,1fr)}
+}
+@media(max-width:860px){
+  .main{grid-template-columns:1fr}
+  .stats-bar{grid-template-columns:repeat(3,1fr)}
+  header{grid-template-columns:1fr auto}
+  .h-nav{display:none}
+}
+@media(max-width:600px){
+  .stats-bar{grid-template-columns:repeat(2,1fr)}
+  .h-brand{padding:10px 14px}
+}
+"""
+
+_DEFERRED_CSS = """
 /* ── SIDEBAR ── */
 .sidebar{
   background:var(--surface);
@@ -1369,7 +1537,7 @@ header{
   display:flex;justify-content:space-between;align-items:center;
   cursor:pointer;
   border-left:2px solid transparent;
-  transition:all .15s;font-size:12px;
+  transition:background-color .15s,border-left-color .15s;font-size:12px;
   text-decoration:none;color:inherit;
 }
 .sb-item:hover{background:var(--surface2);border-left-color:var(--teal)}
@@ -1419,6 +1587,7 @@ header{
   border-radius:var(--radius);
   overflow:hidden;
   transition:box-shadow .2s;
+  contain:layout paint style;
 }
 .sector-card:hover{
   box-shadow:0 0 0 1px rgba(16,185,129,.15),0 8px 32px rgba(0,0,0,.3);
@@ -1498,6 +1667,7 @@ header{
 .price-up{color:var(--teal)}
 .price-dn{color:var(--red)}
 .spark-wrap{margin-top:5px;display:flex;justify-content:flex-end}
+.spark{display:block}
 
 /* RSI */
 .rsi-badge{
@@ -1511,7 +1681,10 @@ header{
   width:72px;height:3px;background:rgba(255,255,255,.08);
   border-radius:2px;margin:5px auto 0;overflow:hidden;
 }
-.rsi-fill{height:100%;border-radius:2px;transition:width .3s}
+.rsi-fill{
+  height:100%;border-radius:2px;
+  transform-origin:left;transition:transform .3s;
+}
 .rsi-fill.rsi-hot {background:var(--red)}
 .rsi-fill.rsi-warm{background:var(--yellow)}
 .rsi-fill.rsi-cold{background:var(--teal)}
@@ -1601,37 +1774,39 @@ footer{
 .status-dot.err {background:var(--red)}
 .status-ts{margin-left:auto;color:var(--text2);font-weight:600;font-family:'DM Mono',monospace;font-size:10px}
 
-/* ── RESPONSIVE ── */
-@media(max-width:1100px){
-  .main{grid-template-columns:200px 1fr}
-  .stat-val{font-size:22px}
-  .stats-bar{grid-template-columns:repeat(3,1fr)}
-}
+/* ── RESPONSIVE (below the fold) ── */
 @media(max-width:860px){
-  .main{grid-template-columns:1fr}
   .sidebar{display:none}
-  .stats-bar{grid-template-columns:repeat(3,1fr)}
-  header{grid-template-columns:1fr auto}
-  .h-nav{display:none}
 }
 @media(max-width:600px){
-  .stats-bar{grid-template-columns:repeat(2,1fr)}
   .cards-wrap{padding:8px}
-  .h-brand{padding:10px 14px}
   footer{font-size:10px}
 }
 """
+_CRITICAL_CSS = minify_css(_CRITICAL_CSS)
+_DEFERRED_CSS = minify_css(_DEFERRED_CSS)
+
+CSS_FILE = "styles.css"
+# Self-contained variant for copies read outside docs/ (email attachment)
+_STYLE_TAG = f"<style>{_CRITICAL_CSS}{_DEFERRED_CSS}</style>"
+_STYLE_DEFERRED = (
+    f"<style>{_CRITICAL_CSS}</style>\n"
+    f'<link rel="preload" href="{CSS_FILE}" as="style" '
+    f"""onload="this.onload=null;this.rel='stylesheet'">\n"""
+    f'<noscript><link rel="stylesheet" href="{CSS_FILE}"></noscript>'
+)
+_STYLE_TAG_B      = _STYLE_TAG.encode("utf-8")
+_STYLE_DEFERRED_B = _STYLE_DEFERRED.encode("utf-8")
+# Marker generate_html_iter yields where the stylesheet goes; each sink fills
+# it with its own variant (linked for docs/, inline for the attachment).
+_STYLE_SLOT = object()
 
-    # ══════════════════════════════════════════════════════════════════════════
-    #  HTML TEMPLATE — Stealth Slate
-    # ══════════════════════════════════════════════════════════════════════════
-    return f"""<!DOCTYPE html>
-<html lang="en">
-<head>
-<meta charset="UTF-8">
-<meta name="viewport" content="width=device-width,initial-scale=1.0">
-<title>FII/DII Pulse &mdash; Institutional Intelligence &mdash; {date_str}</title>
-<style>{css}</style>
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  STATIC HTML FRAGMENTS
+# ─────────────────────────────────────────────────────────────────────────────
+
+_HTML_BRAND = """
 </head>
 <body>
 <div class="w">
@@ -1657,7 +1832,339 @@ footer{
     <span class="h-tab">ALERTS</span>
   </div>
   <div class="h-meta">
-    <div class="h-meta-item">
+"""
+
+# Sidebar legends carry no per-report data — built once, reused every render
+_SB_SIGNAL_GUIDE = """    <div class="sb-section">
+      <div class="sb-title">Signal Guide</div>
+      <div class="sb-legend">
+        <div class="sb-leg-item"><div class="sb-leg-dot" style="background:var(--teal)"></div>⚡ Strong Buy</div>
+        <div class="sb-leg-item"><div class="sb-leg-dot" style="background:var(--blue)"></div>▲ Buy</div>
+        <div class="sb-leg-item"><div class="sb-leg-dot" style="background:var(--purple)"></div>■ Bulk/Block</div>
+        <div class="sb-leg-item"><div class="sb-leg-dot" style="background:var(--text3)"></div>— Neutral</div>
+        <div class="sb-leg-item"><div class="sb-leg-dot" style="background:var(--yellow)"></div>⚠ Caution</div>
+        <div class="sb-leg-item"><div class="sb-leg-dot" style="background:var(--red)"></div>▼ Sell</div>
+      </div>
+    </div>
+"""
+_SB_RSI_GUIDE = """    <div class="sb-section">
+      <div class="sb-title">RSI Guide</div>
+      <div class="sb-legend">
+        <div class="sb-leg-item"><div class="sb-leg-dot" style="background:var(--red)"></div>&gt;70 Overbought</div>
+        <div class="sb-leg-item"><div class="sb-leg-dot" style="background:var(--yellow)"></div>40–70 Mid zone</div>
+        <div class="sb-leg-item"><div class="sb-leg-dot" style="background:var(--teal)"></div>&lt;40 Oversold</div>
+      </div>
+    </div>
+"""
+_SB_FLOW_KEY = """    <div class="sb-section">
+      <div class="sb-title">Flow Key</div>
+      <div class="sb-legend">
+        <div class="sb-leg-item"><div class="sb-leg-dot" style="background:var(--teal)"></div>FII Buying</div>
+        <div class="sb-leg-item"><div class="sb-leg-dot" style="background:var(--blue)"></div>DII Buying</div>
+        <div class="sb-leg-item"><div class="sb-leg-dot" style="background:var(--red)"></div>Selling</div>
+        <div class="sb-leg-item"><div class="sb-leg-dot" style="background:var(--text3)"></div>No activity</div>
+      </div>
+    </div>
+"""
+_SIDEBAR_STATIC = _SB_SIGNAL_GUIDE + _SB_RSI_GUIDE + _SB_FLOW_KEY
+
+# One sidebar sector link — filled per sector with str.format
+_SIDEBAR_ITEM_TMPL = """
+        <a href="#{anchor}" class="sb-item">
+          <div>
+            <div class="sb-item-name">{icon} {sector_name}</div>
+            <div class="sb-item-count">{sec_count} securities</div>
+          </div>
+          <span class="sb-item-sig {sig_cls}">{sig_lbl}</span>
+        </a>"""
+
+# One stock row of a sector card — filled per stock with str.format_map
+_ROW_TMPL = """
+            <tr class="stock-row">
+              <td class="td-stock">
+                <div class="stock-name">{name}</div>
+                <div class="stock-sym">{sym}</div>
+              </td>
+              <td class="td-r">
+                <div class="price-val {price_dir_cls}">{price}</div>
+                <div class="spark-wrap">{spk}</div>
+              </td>
+              <td class="td-c">
+                <div class="rsi-badge {rsi_cls}">{rsi_v}</div>
+                <div class="rsi-track">
+                  <div class="rsi-fill {rsi_cls}" style="transform:scaleX({rsi_scale:.2f})"></div>
+                </div>
+              </td>
+              <td class="td-c">
+                <div class="sr-grid">
+                  <div class="sr-row"><span class="sr-tag r">R1</span><span class="sr-val r">{r1}</span></div>
+                  <div class="sr-row"><span class="sr-tag s">S1</span><span class="sr-val s">{s1}</span></div>
+                  <div class="sr-row"><span class="sr-tag r">6mH</span><span class="sr-val r">{hi6}</span></div>
+                  <div class="sr-row"><span class="sr-tag s">6mL</span><span class="sr-val s">{lo6}</span></div>
+                </div>
+              </td>
+              <td class="td-c">
+                <div class="macd-val">{macd_h}</div>
+                <div class="ema-val">{ema_h}</div>
+              </td>
+              <td class="td-c">
+                <span class="sig-pill {sig_cls}">{sig_label}</span>
+              </td>
+            </tr>"""
+
+# Sector card shell — parsed once here, filled per sector with str.format
+_CARD_TMPL = """
+        <div class="sector-card" id="{anchor}">
+          <div class="sec-card-hdr">
+            <div class="sec-card-left">
+              <span class="sec-icon">{icon}</span>
+              <span class="sec-card-name">{sector_name}</span>
+              <span class="sec-count-badge">{sec_count} securities</span>
+            </div>
+            <div class="sec-hdr-pills">{header_pills}</div>
+          </div>
+          <div class="sec-table-wrap">
+            <table class="sec-table">
+              <thead>
+                <tr>
+                  <th>SECURITY</th>
+                  <th class="th-r">PRICE / TREND</th>
+                  <th class="th-c">RSI (14)</th>
+                  <th class="th-c">S/R LEVELS</th>
+                  <th class="th-c">MACD / EMA</th>
+                  <th class="th-c">SIGNAL</th>
+                </tr>
+              </thead>
+              <tbody>{stock_rows}</tbody>
+            </table>
+          </div>
+        </div>"""
+
+_HTML_TAIL = """
+</div><!-- /w -->
+<script>
+// Clone the ticker client-side so the -50% scroll loops seamlessly
+const tickerInner = document.querySelector('.ticker-inner');
+tickerInner.innerHTML += tickerInner.innerHTML;
+
+// Sparklines — bar charts drawn once from the JSON blob instead of per-row SVG.
+// Each entry is [up, height0, height1, …] with heights already in pixels.
+document.addEventListener('DOMContentLoaded', () => {
+  const series = JSON.parse(document.getElementById('sparkData').textContent);
+  const dpr = window.devicePixelRatio || 1;
+  document.querySelectorAll('canvas.spark').forEach(cv => {
+    const [up, ...bars] = series[+cv.dataset.id];
+    const w = cv.width, h = cv.height;
+    const step = Math.floor(w / bars.length), bw = Math.max(1, step - 1);
+    cv.width = w * dpr; cv.height = h * dpr;
+    cv.style.width = w + 'px'; cv.style.height = h + 'px';
+    const ctx = cv.getContext('2d');
+    ctx.scale(dpr, dpr);
+    ctx.fillStyle = up ? '#10b981' : '#ef4444';
+    bars.forEach((bh, i) => ctx.fillRect(i * step, h - bh, bw, bh));
+  });
+});
+</script>
+</body>
+</html>"""
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  GENERATE HTML  —  Stealth Slate Theme
+# ─────────────────────────────────────────────────────────────────────────────
+
+def generate_html_iter(stocks, market, date_str, source, date_range_label="",
+                       updated_at=""):
+    """Yield the minified report in document order, ready to write as it comes.
+    The stylesheet position is yielded as _STYLE_SLOT for the caller to fill."""
+    return minify_html_iter(_html_chunks(stocks, market, date_str, source,
+                                         date_range_label, updated_at))
+
+
+def _html_chunks(stocks, market, date_str, source, date_range_label,
+                 updated_at):
+
+    # ── Market values — read and formatted once, templates use locals ─────────
+    nifty_price  = market["nifty_price"]
+    nifty_chg    = market["nifty_chg"]
+    sensex_price = market["sensex_price"]
+    sensex_chg   = market["sensex_chg"]
+    n_stocks     = len(stocks)
+
+    nifty_up     = nifty_chg  >= 0
+    sensex_up    = sensex_chg >= 0
+    nc, na       = _UPDN[nifty_up],  _ARROW[nifty_up]
+    xc, xa       = _UPDN[sensex_up], _ARROW[sensex_up]
+    nifty_chg_s  = f"{abs(nifty_chg):.2f}"
+    sensex_chg_s = f"{abs(sensex_chg):.2f}"
+
+    # ── Counts ────────────────────────────────────────────────────────────────
+    fb = db = bb = st = sel = 0
+    for s in stocks:
+        if s["fii_cash"] == "buy":
+            fb += 1
+        if s["dii_cash"] == "buy":
+            db += 1
+        if s["both_buy"]:
+            bb += 1
+        overall = s["overall"]
+        if overall == "STRONG BUY":
+            st += 1
+        elif overall in ("SELL", "BOTH SELL"):
+            sel += 1
+
+    # ── Sector grouping + sorting ─────────────────────────────────────────────
+    for s in stocks:
+        s["sector"] = get_sector(s["symbol"])
+
+    from collections import defaultdict
+    sector_groups = defaultdict(list)
+    for s in stocks:
+        sector_groups[s["sector"]].append(s)
+
+    def signal_sort_key(s):
+        return SIGNAL_ORDER.get(s.get("overall", "N/A"), 5)
+
+    for sec in sector_groups:
+        sector_groups[sec].sort(key=signal_sort_key)
+
+    def sector_best(items):
+        return min(SIGNAL_ORDER.get(s.get("overall", "N/A"), 5) for s in items)
+
+    sorted_sectors = sorted(
+        sector_groups.items(), key=lambda kv: sector_best(kv[1])
+    )
+
+    # ── Sidebar sector list ───────────────────────────────────────────────────
+    sidebar_items = []
+    for sector_name, sec_stocks in sorted_sectors:
+        icon       = SECTOR_ICONS.get(sector_name, "🔷")
+        best_sig   = min(sec_stocks, key=signal_sort_key)["overall"]
+        if best_sig in ("STRONG BUY", "BUY", "BOTH BUY"):
+            sig_cls, sig_lbl = "buy",  "↑ BUY"
+        elif best_sig in ("SELL", "BOTH SELL"):
+            sig_cls, sig_lbl = "sell", "↓ SELL"
+        else:
+            sig_cls, sig_lbl = "hold", "→ HOLD"
+        anchor = sector_name.replace(" ", "_").replace("&", "and")
+        sidebar_items.append(_SIDEBAR_ITEM_TMPL.format(
+            anchor=anchor, icon=icon, sector_name=sector_name,
+            sec_count=len(sec_stocks), sig_cls=sig_cls, sig_lbl=sig_lbl,
+        ))
+
+    # ── Sector card rows ──────────────────────────────────────────────────────
+    # Lookups bound to locals once — the row loop skips the global/attr fetches
+    sig_cls_of   = _SIG_CLASS.get
+    sig_label_of = _SIG_LABEL.get
+    rsi_cls_of   = rsi_class
+    sector_cards = []
+    spark_series = []   # one price list per <canvas class="spark">, by data-id
+
+    for sector_name, sec_stocks in sorted_sectors:
+        icon      = SECTOR_ICONS.get(sector_name, "🔷")
+        anchor    = sector_name.replace(" ", "_").replace("&", "and")
+        sec_count = len(sec_stocks)
+        sec_sb = sec_buy = sec_sell = 0
+        for s in sec_stocks:
+            overall = s["overall"]
+            if overall == "STRONG BUY":
+                sec_sb += 1
+            elif overall == "BUY":
+                sec_buy += 1
+            elif overall in ("SELL", "BOTH SELL"):
+                sec_sell += 1
+
+        # Sector header pills
+        header_pills = []
+        if sec_sb:
+            header_pills.append(f'<span class="hdr-pill sb">⚡ {sec_sb} Strong Buy</span>')
+        if sec_buy:
+            header_pills.append(f'<span class="hdr-pill buy">▲ {sec_buy} Buy</span>')
+        if sec_sell:
+            header_pills.append(f'<span class="hdr-pill sell">▼ {sec_sell} Sell</span>')
+
+        # Build stock rows for this sector card
+        stock_rows = []
+        for s in sec_stocks:
+            # Each field is fetched from the stock dict exactly once
+            spark       = s.get("sparkline") or ()
+            last        = s["last_price"]
+            rsi_v       = s["rsi"]
+            overall     = s["overall"]
+            sym         = s["symbol"].replace(".NS", "")
+            price       = fmt_price(last) if last > 0 else "—"
+            spk         = spark_canvas(spark, spark_series)
+            rsi_cls     = rsi_cls_of(rsi_v)
+            macd_h      = fmt_macd(s["macd_hist"])
+            ema_h       = fmt_ema(s["ema_cross"])
+            sig_cls_val = sig_cls_of(overall, "sig-neutral")
+            is_up       = len(spark) >= 2 and spark[-1] >= spark[0]
+            sig_label   = sig_label_of(overall, "— NEUTRAL")
+
+            stock_rows.append(_ROW_TMPL.format_map({
+                "name":          s["name"],
+                "sym":           sym,
+                "price_dir_cls": _PRICE_DIR[is_up],
+                "price":         price,
+                "spk":           spk,
+                "rsi_cls":       rsi_cls,
+                "rsi_v":         rsi_v,
+                "rsi_scale":     min(rsi_v, 100) / 100,
+                "r1":            fmt_price(s["resist1"]),
+                "s1":            fmt_price(s["support1"]),
+                "hi6":           fmt_price(s["swing_high"]),
+                "lo6":           fmt_price(s["swing_low"]),
+                "macd_h":        macd_h,
+                "ema_h":         ema_h,
+                "sig_cls":       sig_cls_val,
+                "sig_label":     sig_label,
+            }))
+
+        sector_cards.append(_CARD_TMPL.format(
+            anchor=anchor, icon=icon, sector_name=sector_name,
+            sec_count=sec_count, header_pills="".join(header_pills),
+            stock_rows="".join(stock_rows),
+        ))
+
+    # ── IST timestamp (main() passes the one it already formatted) ────────────
+    now_ist = updated_at or datetime.now(_IST).strftime("%d-%b-%Y %H:%M IST")
+
+    # ── Ticker tape ───────────────────────────────────────────────────────────
+    ticker_items = [
+        ("NIFTY 50",  f"&#8377;{nifty_price:,.2f}",  nc, f"{na}{nifty_chg_s}%"),
+        ("SENSEX",    f"&#8377;{sensex_price:,.2f}", xc, f"{xa}{sensex_chg_s}%"),
+        ("TRACKED",   str(n_stocks),    "up",  f"FII:{fb} · DII:{db}"),
+        ("BOTH BUY",  str(bb),          "up",  "securities"),
+        ("STRONG BUY",str(st),          "up",  "signals"),
+        ("SELL ALERT",str(sel),         _UPDN[sel == 0], "caution"),
+        ("SOURCE",    source[:20],      "up",  "NSE CSV"),
+        ("RANGE",     date_range_label, "up",  "window"),
+    ]
+    ticker_html = "".join(
+        f'<div class="t-item">'
+        f'<span class="t-sym">{sym}</span>'
+        f'<span class="t-val {cls}">{val}</span>'
+        f'<span class="t-extra">{extra}</span>'
+        f'</div>'
+        for sym, val, cls, extra in ticker_items
+    )
+
+    # ══════════════════════════════════════════════════════════════════════════
+    #  HTML TEMPLATE — Stealth Slate
+    # ══════════════════════════════════════════════════════════════════════════
+    range_pill = (f'<span class="content-hdr-range">📅 {date_range_label}</span>'
+                  if date_range_label else '')
+
+    yield f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="UTF-8">
+<meta name="viewport" content="width=device-width,initial-scale=1.0">
+<title>FII/DII Pulse &mdash; Institutional Intelligence &mdash; {date_str}</title>
+"""
+    yield _STYLE_SLOT
+    yield _HTML_BRAND
+    yield f"""    <div class="h-meta-item">
       <div class="h-meta-label">Range</div>
       <div class="h-meta-val">{date_range_label or date_str}</div>
     </div>
@@ -1673,24 +2180,26 @@ footer{
 
 <!-- ═══ TICKER ═══ -->
 <div class="ticker-wrap">
-  <div class="ticker-inner">{ticker_html}</div>
+  <div class="ticker-inner">"""
+    yield ticker_html
+    yield f"""</div>
 </div>
 
 <!-- ═══ STATS BAR ═══ -->
 <div class="stats-bar">
   <div class="stat">
     <div class="stat-lbl">Nifty 50</div>
-    <div class="stat-val">&#8377;{market['nifty_price']:,.0f}</div>
-    <div class="stat-chg {nc}">{na} {abs(market['nifty_chg']):.2f}%</div>
+    <div class="stat-val">&#8377;{nifty_price:,.0f}</div>
+    <div class="stat-chg {nc}">{na} {nifty_chg_s}%</div>
   </div>
   <div class="stat">
     <div class="stat-lbl">Sensex</div>
-    <div class="stat-val">&#8377;{market['sensex_price']:,.0f}</div>
-    <div class="stat-chg {xc}">{xa} {abs(market['sensex_chg']):.2f}%</div>
+    <div class="stat-val">&#8377;{sensex_price:,.0f}</div>
+    <div class="stat-chg {xc}">{xa} {sensex_chg_s}%</div>
   </div>
   <div class="stat">
     <div class="stat-lbl">Tracked</div>
-    <div class="stat-val">{len(stocks)}</div>
+    <div class="stat-val">{n_stocks}</div>
     <div class="stat-chg neu">Securities</div>
   </div>
   <div class="stat">
@@ -1717,37 +2226,13 @@ footer{
   <div class="sidebar">
     <div class="sb-section">
       <div class="sb-title">Sectors</div>
-      {sidebar_items}
+      """
+    yield from sidebar_items
+    yield """
     </div>
-    <div class="sb-section">
-      <div class="sb-title">Signal Guide</div>
-      <div class="sb-legend">
-        <div class="sb-leg-item"><div class="sb-leg-dot" style="background:var(--teal)"></div>⚡ Strong Buy</div>
-        <div class="sb-leg-item"><div class="sb-leg-dot" style="background:var(--blue)"></div>▲ Buy</div>
-        <div class="sb-leg-item"><div class="sb-leg-dot" style="background:var(--purple)"></div>■ Bulk/Block</div>
-        <div class="sb-leg-item"><div class="sb-leg-dot" style="background:var(--text3)"></div>— Neutral</div>
-        <div class="sb-leg-item"><div class="sb-leg-dot" style="background:var(--yellow)"></div>⚠ Caution</div>
-        <div class="sb-leg-item"><div class="sb-leg-dot" style="background:var(--red)"></div>▼ Sell</div>
-      </div>
-    </div>
-    <div class="sb-section">
-      <div class="sb-title">RSI Guide</div>
-      <div class="sb-legend">
-        <div class="sb-leg-item"><div class="sb-leg-dot" style="background:var(--red)"></div>&gt;70 Overbought</div>
-        <div class="sb-leg-item"><div class="sb-leg-dot" style="background:var(--yellow)"></div>40–70 Mid zone</div>
-        <div class="sb-leg-item"><div class="sb-leg-dot" style="background:var(--teal)"></div>&lt;40 Oversold</div>
-      </div>
-    </div>
-    <div class="sb-section">
-      <div class="sb-title">Flow Key</div>
-      <div class="sb-legend">
-        <div class="sb-leg-item"><div class="sb-leg-dot" style="background:var(--teal)"></div>FII Buying</div>
-        <div class="sb-leg-item"><div class="sb-leg-dot" style="background:var(--blue)"></div>DII Buying</div>
-        <div class="sb-leg-item"><div class="sb-leg-dot" style="background:var(--red)"></div>Selling</div>
-        <div class="sb-leg-item"><div class="sb-leg-dot" style="background:var(--text3)"></div>No activity</div>
-      </div>
-    </div>
-  </div>
+"""
+    yield _SIDEBAR_STATIC
+    yield """  </div>
 
   <!-- CONTENT -->
   <div class="content">
@@ -1755,12 +2240,15 @@ footer{
       <div class="content-hdr-title">
         Sector-wise Institutional Flow &mdash; Strong Buy &rarr; Sell
       </div>
-      {f'<span class="content-hdr-range">📅 {date_range_label}</span>' if date_range_label else ''}
+"""
+    yield f"""      {range_pill}
       <div class="content-hdr-src">📡 {source} &middot; yfinance technicals</div>
     </div>
 
     <div class="cards-wrap">
-      {sector_cards}
+      """
+    yield from sector_cards
+    yield f"""
     </div>
   </div><!-- /content -->
 
@@ -1780,22 +2268,67 @@ footer{
 <div class="status-bar">
   <div class="status-item"><div class="status-dot ok"></div>NSE CSV API: OK</div>
   <div class="status-item"><div class="status-dot ok"></div>yfinance: OK</div>
-  <div class="status-item"><div class="status-dot ok"></div>{len(stocks)} stocks loaded</div>
+  <div class="status-item"><div class="status-dot ok"></div>{n_stocks} stocks loaded</div>
   <div class="status-item"><div class="status-dot ok"></div>Technicals computed</div>
   <div class="status-ts">LAST UPDATE: {now_ist}</div>
 </div>
-
-</div><!-- /w -->
-</body>
-</html>"""
+"""
+    yield '<script id="sparkData" type="application/json">'
+    yield json.dumps(spark_series, separators=(",", ":"))
+    yield "</script>"
+    yield _HTML_TAIL
 
 
 # ─────────────────────────────────────────────────────────────────────────────
 #  EMAIL
 # ─────────────────────────────────────────────────────────────────────────────
 
-def send_email(html_path: Path, date_str: str, source: str,
+_MAIL_OPTIONS = ["BODY=8BITMIME"]   # Gmail advertises 8BITMIME
+# Bad credentials look the same to the user whichever client sent the mail
+_AUTH_ERRORS = (smtplib.SMTPAuthenticationError,
+                *((aiosmtplib.SMTPAuthenticationError,) if aiosmtplib else ()))
+# One TLS context for every connection: the CA store is loaded once, not per
+# handshake, and the parallel sends share it.
+_SMTP_CTX = ssl.create_default_context()
+
+
+def _smtp_session(user: str, pwd: str) -> smtplib.SMTP_SSL:
+    """Open and authenticate one Gmail connection; reuse it for every message."""
+    srv = smtplib.SMTP_SSL("smtp.gmail.com", 465, timeout=30, context=_SMTP_CTX)
+    try:
+        srv.login(user, pwd)
+    except Exception:
+        srv.close()
+        raise
+    return srv
+
+
+async def _send_parallel(msg: EmailMessage, user: str, pwd: str, to_list: list):
+    """One connection per recipient, all in flight at once — wall time tracks
+    the slowest send instead of the sum of them."""
+    async def _send_one(rcpt):
+        async with aiosmtplib.SMTP(hostname="smtp.gmail.com", port=465,
+                                   use_tls=True, tls_context=_SMTP_CTX, timeout=30,
+                                   username=user, password=pwd) as srv:
+            await srv.send_message(msg, sender=user, recipients=[rcpt],
+                                   mail_options=_MAIL_OPTIONS)
+
+    # Every send runs to completion; a failure for one recipient is reported
+    # with its address instead of masking which of the others went through
+    results = await asyncio.gather(*(_send_one(r) for r in to_list),
+                                   return_exceptions=True)
+    failed  = [(r, e) for r, e in zip(to_list, results) if isinstance(e, BaseException)]
+    if failed:
+        for rcpt, e in failed:
+            log.error("  ❌ Send to %s failed: %s", rcpt, e)
+        log.warning("  ⚠️  Delivered to %d of %d recipients",
+                    len(to_list) - len(failed), len(to_list))
+        raise failed[0][1]
+
+
+def send_email(html_gz: bytes, report_name: str, date_str: str, source: str,
                count: int, date_range_label: str = ""):
+    """Mail the dashboard; html_gz is the self-contained report, already gzipped."""
     user  = os.getenv("GMAIL_USER", "").strip()
     pwd   = os.getenv("GMAIL_PASS", "").strip()
     rcpts = os.getenv("RECIPIENT_EMAIL", user).strip()
@@ -1805,11 +2338,11 @@ def send_email(html_path: Path, date_str: str, source: str,
         return
 
     to_list = [r.strip() for r in rcpts.split(",") if r.strip()]
-    log.info(f"📧 Sending full HTML dashboard to: {to_list}")
+    log.info("📧 Sending gzipped HTML dashboard to: %s", to_list)
 
-    full_html = html_path.read_text(encoding="utf-8")
+    attach_name = f"{report_name}.gz"
 
-    msg            = MIMEMultipart("alternative")
+    msg            = EmailMessage(policy=SMTP)
     msg["Subject"] = f"📊 FII/DII Pulse · Stealth Slate — {date_str}"
     msg["From"]    = f"FII/DII Pulse <{user}>"
     msg["To"]      = ", ".join(to_list)
@@ -1820,22 +2353,28 @@ def send_email(html_path: Path, date_str: str, source: str,
         f"Source: {source}\n"
         f"Date range: {date_range_label}\n"
         f"Stocks tracked: {count}\n\n"
-        f"Please open this email in an HTML-capable client to view the full dashboard.\n"
+        f"The full dashboard is attached as {attach_name} — extract it and open it in a browser.\n"
         f"Not financial advice. Educational purposes only."
     )
-    msg.attach(MIMEText(plain, "plain", "utf-8"))
-    msg.attach(MIMEText(full_html, "html", "utf-8"))
+    # The text part goes out as raw UTF-8 (8BITMIME) instead of base64; the
+    # gzip attachment is binary and still needs base64.
+    msg.set_content(plain, cte="8bit")
+    msg.add_attachment(html_gz, maintype="application", subtype="gzip",
+                       filename=attach_name)
 
     try:
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465, timeout=30) as srv:
-            srv.login(user, pwd)
-            srv.sendmail(user, to_list, msg.as_string())
-        log.info(f"  ✅ Full HTML dashboard emailed to {to_list}")
-    except smtplib.SMTPAuthenticationError:
+        if len(to_list) > 1 and aiosmtplib is not None:
+            asyncio.run(_send_parallel(msg, user, pwd, to_list))
+        else:
+            with _smtp_session(user, pwd) as srv:
+                srv.send_message(msg, from_addr=user, to_addrs=to_list,
+                                 mail_options=_MAIL_OPTIONS)
+        log.info("  ✅ Dashboard (%d bytes gzipped) emailed to %s", len(html_gz), to_list)
+    except _AUTH_ERRORS:
         log.error("  ❌ Gmail auth failed — use App Password")
         raise
     except Exception as e:
-        log.error(f"  ❌ Email error: {e}")
+        log.error("  ❌ Email error: %s", e)
         raise
 
 
@@ -1843,14 +2382,34 @@ def send_email(html_path: Path, date_str: str, source: str,
 #  MAIN
 # ─────────────────────────────────────────────────────────────────────────────
 
+def _report_key(*inputs) -> str:
+    """Digest of everything a report is rendered from, bar the run timestamp."""
+    inputs = (_CODE_VERSION, *inputs)
+    if orjson is not None:
+        blob = orjson.dumps(inputs, default=str, option=orjson.OPT_SORT_KEYS)
+    else:
+        blob = json.dumps(inputs, default=str, sort_keys=True).encode("utf-8")
+    return hashlib.blake2b(blob, digest_size=16).hexdigest()
+
+
+def _step_output(name: str, value: str):
+    """Expose a value to later workflow steps; a no-op outside GitHub Actions."""
+    path = os.getenv("GITHUB_OUTPUT")
+    if path:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(f"{name}={value}\n")
+
+
 def main():
-    IST      = pytz.timezone("Asia/Kolkata")
-    now_ist  = datetime.now(IST)
-    date_str = now_ist.strftime("%d %b %Y")
-    date_file= now_ist.strftime("%Y-%m-%d")
+    # Every timestamp string is formatted once from a single struct_time
+    ts         = datetime.now(_IST).timetuple()
+    date_str   = time.strftime("%d %b %Y", ts)
+    date_file  = time.strftime("%Y-%m-%d", ts)
+    hhmm       = time.strftime("%H:%M", ts)
+    updated_at = time.strftime("%d-%b-%Y %H:%M IST", ts)
 
     log.info("=" * 65)
-    log.info(f"  📊 FII/DII Pulse v8 Stealth Slate — {date_str}  (IST: {now_ist.strftime('%H:%M')})")
+    log.info("  📊 FII/DII Pulse v8 Stealth Slate — %s  (IST: %s)", date_str, hhmm)
     log.info("=" * 65)
 
     try:
@@ -1859,20 +2418,84 @@ def main():
         date_range_label = ""
 
     stocks, market, source = build_dataset()
-    log.info(f"📊 Stocks enriched: {len(stocks)}")
-
-    html = generate_html(stocks, market, date_str, source, date_range_label)
+    log.info("📊 Stocks enriched: %d", len(stocks))
 
     index_path = OUTPUT_DIR / "index.html"
     dated_path = OUTPUT_DIR / f"report_{date_file}.html"
-    for p in [index_path, dated_path]:
-        p.write_text(html, encoding="utf-8")
-        log.info(f"💾 Saved: {p}")
 
-    send_email(dated_path, date_str, source, len(stocks), date_range_label)
+    # Re-runs on unchanged data (same day, same deals, same prices, same code)
+    # would only re-render, re-send and re-deploy the same report. Under
+    # Actions docs/ is a fresh checkout, but the published copy on gh-pages is
+    # left alone because the deploy step is gated on the "changed" output.
+    key       = _report_key(stocks, market, source, date_file, date_range_label)
+    published = dated_path.exists() or os.getenv("GITHUB_OUTPUT") is not None
+    try:
+        unchanged = published and REPORT_KEY_FILE.read_text() == key
+    except OSError:
+        unchanged = False
+    _step_output("changed", "false" if unchanged else "true")
+    if unchanged:
+        log.info("⏭  Data unchanged since the last report — nothing to render or send")
+        return
+
+    # One render, one UTF-8 encode per chunk. The bytes go straight to disk
+    # and into the gzip attachment (HTML compresses ~10x). The style slot is
+    # the one place they differ: docs/ links styles.css, while the attachment
+    # is opened away from docs/ and gets every rule inline.
+    # The page lands in a temp file renamed over index.html once complete, so
+    # a failed render never leaves a truncated page — nor truncates the
+    # earlier dated report index.html may still be hard-linked to.
+    gz       = zlib.compressobj(6, zlib.DEFLATED, 31)   # wbits 31 → gzip container
+    gz_body  = []
+    tmp_path = index_path.with_suffix(".html.tmp")
+    try:
+        with tmp_path.open("wb") as f:
+            for chunk in generate_html_iter(stocks, market, date_str, source,
+                                            date_range_label, updated_at):
+                if chunk is _STYLE_SLOT:
+                    f.write(_STYLE_DEFERRED_B)
+                    gz_body.append(gz.compress(_STYLE_TAG_B))
+                    continue
+                data = chunk.encode("utf-8")
+                f.write(data)
+                gz_body.append(gz.compress(data))
+        os.replace(tmp_path, index_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    gz_body.append(gz.flush())
+    log.info("💾 Saved: %s", index_path)
+
+    # Same content — link instead of writing it a second time
+    dated_path.unlink(missing_ok=True)
+    try:
+        os.link(index_path, dated_path)
+    except OSError:
+        shutil.copyfile(index_path, dated_path)
+    log.info("💾 Saved: %s", dated_path)
+
+    # The gzip stream is the self-contained variant (every rule inline), so the
+    # .html.gz next to the dated report opens anywhere — and it is what gets mailed
+    html_gz = b"".join(gz_body)
+    gz_path = dated_path.with_suffix(".html.gz")
+    gz_path.write_bytes(html_gz)
+    log.info("💾 Saved: %s", gz_path)
+
+    css_path = OUTPUT_DIR / CSS_FILE
+    css_path.write_text(_DEFERRED_CSS, encoding="utf-8")
+    log.info("💾 Saved: %s", css_path)
+
+    send_email(html_gz, dated_path.name, date_str, source, len(stocks),
+               date_range_label)
+
+    try:
+        REPORT_KEY_FILE.parent.mkdir(parents=True, exist_ok=True)
+        REPORT_KEY_FILE.write_text(key)
+    except OSError as e:
+        log.warning("⚠️  Could not save report key: %s", e)
 
     log.info("=" * 65)
-    log.info(f"  ✅ Complete! Range: {date_range_label} | Stocks: {len(stocks)}")
+    log.info("  ✅ Complete! Range: %s | Stocks: %d", date_range_label, len(stocks))
     log.info("=" * 65)
 
 